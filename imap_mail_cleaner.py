@@ -8,23 +8,46 @@ IMAP mailbox cleaner.
 
 注意:
 - 本スクリプトは IMAP の RFC822 メッセージを取得してローカルで正規表現判定します
-- Trash への移動は COPY → \\Deleted フラグ付与 → EXPUNGE で実現します (MOVE 拡張は未使用)
+- Trash への移動はサーバーが MOVE 拡張 (RFC 6851) を広告していれば UID MOVE 1 コマンドで、
+  無ければ COPY → \\Deleted フラグ付与 → EXPUNGE で実現します
 """
 
 from __future__ import annotations
 
 import argparse
+import collections
 import os
+import queue
 import sys
+import threading
+import time
 import traceback
-from typing import Optional, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 from datetime import datetime, timedelta, timezone
 
 import imaplib
 
-from mods.config import AccountConfig, load_accounts_from_config
+from mods.config import AccountConfig, ServerConfig, load_accounts_from_config
 from mods.imap_client import ImapClient
-from utils.imap_utils import message_fields, rule_matches_message
+from utils.imap_utils import (
+    message_fields,
+    prescreen_haystack,
+    rendered_body_text,
+    rule_matches_message,
+    rule_prescreen,
+)
 
 
 # ------------------------------
@@ -36,19 +59,192 @@ class ProcessingCanceled(Exception):
     """ユーザーが対話モードで処理中断 (cancel) を選んだことを示す例外。"""
 
 
+# ------------------------------
+# Connection pool
+# ------------------------------
+
+# (host, username) 毎に接続を保持し、TLS 接続 + LOGIN のコストを
+# 2 回目以降の process_account 呼び出しで省く
+_client_pool: Dict[Tuple[str, str], ImapClient] = {}
+
+
+def _pooled_client(server: ServerConfig) -> ImapClient:
+    """プールから接続済みクライアントを取得する (無ければ接続して登録)。
+
+    再利用時は NOOP で生存確認し、切断されていたら破棄して接続し直す。
+    """
+    key = (server.host, server.username)
+    client = _client_pool.get(key)
+    if client is not None:
+        if client.noop():
+            return client
+        client.disconnect()
+        _client_pool.pop(key, None)
+    client = ImapClient(server)
+    try:
+        client.connect()
+    except Exception:
+        # LOGIN 後に失敗する場合もあるため、接続をリークさせない
+        client.disconnect()
+        raise
+    _client_pool[key] = client
+    return client
+
+
+def _close_pooled_clients() -> None:
+    for client in _client_pool.values():
+        client.disconnect()
+    _client_pool.clear()
+
+
+# 先読みキューの深さ。FETCH (ネットワーク) とルール評価 (CPU) を
+# 重ねるためのバッファで、メモリに保持するメッセージ数の上限になる
+_PREFETCH_QUEUE_SIZE = 64
+
+
+def _prefetch_iter(source: Iterable[Any]) -> Iterator[Any]:
+    """イテレータを別スレッドで先読みしながら順に返すジェネレータ。
+
+    FETCH のネットワーク待ちとメッセージ解析/正規表現評価を重ねるため、
+    プロデューサスレッドが source を回して有界キューに詰め、メインスレッド
+    が取り出して処理する。プロデューサ側の例外はメインスレッドで再送出
+    する。消費側はプロデューサ完了まで IMAP コマンドを発行しないこと
+    (接続はスレッドセーフではない)。
+    """
+    q: "queue.Queue[Any]" = queue.Queue(maxsize=_PREFETCH_QUEUE_SIZE)
+    stop = threading.Event()
+    error: List[BaseException] = []
+
+    def producer():
+        try:
+            for item in source:
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except BaseException as ex:  # pylint: disable=broad-exception-caught
+            error.append(ex)
+        finally:
+            q.put(None)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            yield item
+    finally:
+        # 消費を中断した場合もプロデューサを確実に止めてから戻る
+        stop.set()
+        while thread.is_alive():
+            try:
+                q.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        thread.join()
+    if error:
+        raise error[0]
+
+
+def _evaluate_parallel(
+    func: Callable[[Any], Any],
+    source: Iterable[Any],
+    max_workers: Optional[int] = None,
+) -> Iterator[Any]:
+    """source の要素を入力順を保ったままスレッドプールで func に通す。
+
+    メッセージ解析 + ルール評価を複数スレッドに分散し、先読みスレッドの
+    FETCH と重ねる。投入は有界 (ワーカー数の 2 倍) に保ち、完了した結果を
+    先頭から取り出すので順序は崩れない。func は IMAP コマンドを発行しない
+    こと (接続はスレッドセーフではない)。
+    """
+    workers = max_workers or min(4, os.cpu_count() or 1)
+    pending: Deque["Future[Any]"] = collections.deque()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for item in source:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    finally:
+        # close() や例外で抜ける場合も source (先読みジェネレータ) を
+        # 明示的に閉じ、プロデューサスレッドの停止まで待つ
+        close = getattr(source, "close", None)
+        if close is not None:
+            close()
+
+
+class ProgressPrinter:
+    """同一行を上書きする進捗表示。
+
+    メッセージ毎に print + flush (syscall 2 回) を発行すると、SSH 越しの
+    遅い端末では進捗表示だけで処理時間を支配しかねない。update() は
+    時間間隔 (既定 100ms) で間引き、間引かれた行は単に捨てる (進捗行は
+    最新のものだけ意味がある)。log() は進捗行をクリアして恒久的な行を
+    出力する。
+    """
+
+    def __init__(self, interval: float = 0.1) -> None:
+        self._interval = interval
+        self._last_update = 0.0
+        self._last_len = 0
+
+    def update(self, line: str) -> None:
+        now = time.monotonic()
+        if now - self._last_update < self._interval:
+            return
+        self._last_update = now
+        pad = max(self._last_len - len(line), 0)
+        sys.stdout.write("\r" + line + " " * pad)
+        sys.stdout.flush()
+        self._last_len = len(line)
+
+    def log(self, line: str) -> None:
+        self._clear()
+        print(line)
+
+    def done(self) -> None:
+        self._clear()
+
+    def _clear(self) -> None:
+        if self._last_len:
+            sys.stdout.write("\r" + " " * self._last_len + "\r")
+            sys.stdout.flush()
+            self._last_len = 0
+
+
 def _short_snippet(text: str, max_chars: int = 200) -> str:
     """Create a short snippet of text for display."""
-    t = text.strip().replace("\r\n", "\n").replace("\r", "\n")
+    t = text.strip()
+    # CR が無ければ置換パス (本文全体のコピー 2 回) を丸ごと省ける
+    if "\r" in t:
+        t = t.replace("\r\n", "\n").replace("\r", "\n")
     if len(t) <= max_chars:
         return t
     return t[: max_chars - 3] + "..."
 
 
-def _interactive_confirm(subject: str, body_text: str, action: str) -> str:
+def _interactive_confirm(
+    subject: str,
+    body_text: str,
+    action: str,
+    fetch_full_body: Optional[Callable[[], Optional[str]]] = None,
+) -> str:
     print("\n--- Target Email ---")
     print(f"Subject: {subject}")
     print("Body (preview):")
     print(_short_snippet(body_text))
+    # --max-body-bytes で切り詰めた本文しか持っていない場合、d の全文表示は
+    # fetch_full_body で必要になった時だけ RFC822 全体を取り直す
+    full_body: Optional[str] = None
     while True:
         if action.lower() == "trash":
             question = "Move to trash?"
@@ -64,23 +260,31 @@ def _interactive_confirm(subject: str, body_text: str, action: str) -> str:
         if choice == "n":
             return "no"
         if choice == "d":
+            if full_body is None and fetch_full_body is not None:
+                full_body = fetch_full_body()
+                if full_body is None:
+                    print("[WARN] Failed to fetch full body.")
             print("--- Body (full) ---")
-            print(body_text)
+            print(full_body if full_body is not None else body_text)
             continue
         if choice == "c":
             return "cancel"
         print("Please enter y / n / d / c")
 
 
-def _apply_action_for_message(
-    imap: ImapClient,
-    uid: str,
+def _confirm_action_for_message(
     action: str,
     trash_mailbox: Optional[str],
     subject: str,
     body_text: str,
     interactive: bool,
+    fetch_full_body: Optional[Callable[[], Optional[str]]] = None,
 ) -> str:
+    """メッセージに対するアクションを確定する (IMAP コマンドは発行しない)。
+
+    実際の削除/移動は UID を溜めて一括実行するため、ここでは対話確認と
+    Trash の有無チェックのみを行い "delete" / "trash" / "skip" を返す。
+    """
     # trash の場合は trash_mailbox が必須
     if action == "trash":
         if not trash_mailbox:
@@ -88,35 +292,20 @@ def _apply_action_for_message(
             return "skip"
 
     if interactive:
-        decision = _interactive_confirm(subject, body_text, action)
+        decision = _interactive_confirm(subject, body_text, action, fetch_full_body)
         if decision == "no":
             return "skip"
         if decision == "cancel":
             raise ProcessingCanceled()
 
-    if action == "trash" and trash_mailbox:
-        copied = imap.copy_to_mailbox(uid, trash_mailbox)
-        if not copied:
-            print(
-                f'[WARN] Failed to copy to Trash ("{trash_mailbox}"). Skipping this message.'
-            )
-            return "error"
-
-        # delete original
-        if imap.mark_deleted(uid):
-            return "trash"
-        else:
-            return "error"
-
-    # default: delete
-    if imap.mark_deleted(uid):
-        return "delete"
-    else:
-        return "error"
+    return action if action == "trash" else "delete"
 
 
 def process_account(
-    account: AccountConfig, interactive: bool, skip_days: int = 30
+    account: AccountConfig,
+    interactive: bool,
+    skip_days: int = 30,
+    max_body_bytes: int = 65536,
 ) -> None:
     print(f"==== Account: {account.name} ====")
 
@@ -131,116 +320,197 @@ def process_account(
         print("[INFO] All emails are targeted")
 
     try:
-        with ImapClient(account.server) as client:
-            client.connect()
-
-            # Trash 特定を最初に実施
-            trash_mailbox = client.find_trash_mailbox()
-            if not trash_mailbox:
-                print("[WARN] Could not detect Trash mailbox.")
-
-            for cleanup in account.cleanups:
-                for requested_mailbox in cleanup.mailboxes:
-                    if not client.mailbox_exists(requested_mailbox):
-                        print(f"[WARN] Mailbox not found: {requested_mailbox}")
-                        continue
-                    print(f"-- Mailbox: {requested_mailbox}")
-                    if not client.select_mailbox(requested_mailbox):
-                        print(f"[WARN] Failed to select mailbox: {requested_mailbox}")
-                        continue
-
-                        # 大量件数対応: UID をチャンク列挙しながら逐次処理
-                    uid_iter = client.iter_all_uids()
-                    counts = {"delete": 0, "trash": 0, "skip": 0, "error": 0}
-                    total_checked = 0
-
-                    for uid in uid_iter:
-                        total_checked += 1
-
-                        # skip_days が指定されている場合、受信日時をチェック
-                        if cutoff_date is not None:
-                            msg_date = client.fetch_message_date(uid)
-                            if msg_date is not None:
-                                # タイムゾーン情報がない場合はUTCとして扱う
-                                if msg_date.tzinfo is None:
-                                    msg_date = msg_date.replace(tzinfo=timezone.utc)
-                                else:
-                                    # UTCに変換して比較
-                                    msg_date = msg_date.astimezone(timezone.utc)
-
-                                # カットオフ日時より新しいメールはスキップ
-                                if msg_date > cutoff_date:
-                                    continue
-
-                        msg = client.fetch_message_rfc822(uid)
-                        if msg is None:
-                            print(
-                                f"\r[SKIP] UID:{uid} (fetch failed)", end="", flush=True
+        client = _pooled_client(account.server)
+        # Trash 特定を最初に実施
+        trash_mailbox = client.find_trash_mailbox()
+        if not trash_mailbox:
+            print("[WARN] Could not detect Trash mailbox.")
+
+        for cleanup in account.cleanups:
+            # body を参照するルールが 1 つも無ければ、本文の転送・解析を
+            # 丸ごと省いてヘッダフィールドのみ FETCH する
+            needs_body = any(r.body_re or r.body_lit for r in cleanup.rules)
+            for requested_mailbox in cleanup.mailboxes:
+                # ディスクキャッシュに無い場合は一覧を取り直してから判定する
+                if not client.ensure_mailbox_known(requested_mailbox):
+                    print(f"[WARN] Mailbox not found: {requested_mailbox}")
+                    continue
+                print(f"-- Mailbox: {requested_mailbox}")
+                if not client.select_mailbox(requested_mailbox):
+                    print(f"[WARN] Failed to select mailbox: {requested_mailbox}")
+                    continue
+
+                # 大量件数対応: UID をチャンク列挙しながら逐次処理
+                counts = {"delete": 0, "trash": 0, "skip": 0, "error": 0}
+                total_checked = 0
+                progress = ProgressPrinter()
+
+                # アクション対象 UID は溜めておき、UID セットで一括発行する
+                pending: Dict[str, List[int]] = {"delete": [], "trash": []}
+
+                def flush_actions():
+                    if pending["delete"]:
+                        ok = client.mark_deleted_bulk(pending["delete"])
+                        counts["delete" if ok else "error"] += len(
+                            pending["delete"]
+                        )
+                        if not ok:
+                            print("[WARN] Failed to mark messages deleted.")
+                        pending["delete"] = []
+                    if pending["trash"]:
+                        # trash 未検出時は pending["trash"] に積まれない想定
+                        # だが、型の上でも None をここで除外する
+                        if trash_mailbox is None:
+                            counts["error"] += len(pending["trash"])
+                            print("[WARN] Trash mailbox not found.")
+                            pending["trash"] = []
+                            return
+                        if client.supports_move():
+                            ok = client.move_to_mailbox(
+                                pending["trash"], trash_mailbox
                             )
-                            continue
-                        subject, from_addr, to_addr, body_text, body_html = (
-                            message_fields(msg)
+                        else:
+                            ok = client.copy_to_mailbox_bulk(
+                                pending["trash"], trash_mailbox
+                            ) and client.mark_deleted_bulk(pending["trash"])
+                        counts["trash" if ok else "error"] += len(
+                            pending["trash"]
                         )
+                        if not ok:
+                            print(
+                                f'[WARN] Failed to move messages to Trash ("{trash_mailbox}").'
+                            )
+                        pending["trash"] = []
+
+                def eligible_uids():
+                    # 対象 UID の列挙。skip_days 指定時は SEARCH BEFORE で
+                    # サーバー側に日付フィルタを任せ、メッセージ毎の
+                    # 受信日時 FETCH を不要にする
+                    nonlocal total_checked
+                    if cutoff_date is not None:
+                        uid_source = client.search_uids_before(cutoff_date)
+                    else:
+                        uid_source = client.iter_all_uids()
+                    for uid in uid_source:
+                        total_checked += 1
+                        yield uid
+
+                # FETCH はバッチ化し、先読みスレッドでネットワーク待ちと
+                # ルール評価を重ねる。対話モードでは input() 待ちが支配的で
+                # 先読みの利点が無く、d の全文取得で同一接続に FETCH を
+                # 発行するため (接続はスレッドセーフではない)、メイン
+                # スレッドで直接イテレートする
+                def evaluate_message(item):
+                    # メッセージ解析とルール判定 (IMAP コマンドは発行しない
+                    # ためワーカースレッドで実行できる)
+                    uid, msg = item
+                    subject, from_addr, to_addr, body_text, body_html = (
+                        message_fields(msg, max_body_bytes, want_body=needs_body)
+                    )
 
+                    # リテラルプリフィルタ用ハイスタック (必要なルールがある場合のみ生成)
+                    haystack: Optional[str] = None
+
+                    # ルールを順次評価。最初にマッチしたルールの action を適用
+                    chosen_action: Optional[str] = None
+                    for rule in cleanup.rules:
+                        if rule.required_literals:
+                            if haystack is None:
+                                haystack = prescreen_haystack(
+                                    subject, body_text, body_html, from_addr, to_addr
+                                )
+                            if not rule_prescreen(rule, haystack):
+                                continue
+                        if rule_matches_message(
+                            rule,
+                            subject,
+                            body_text,
+                            body_html,
+                            from_addr,
+                            to_addr,
+                        ):
+                            chosen_action = rule.action or "delete"
+                            break
+                    return uid, subject, body_text, chosen_action
+
+                if needs_body:
+                    message_iter = client.fetch_messages_bulk(
+                        eligible_uids(),
+                        batch_size=account.server.fetch_batch_size,
+                    )
+                else:
+                    message_iter = client.fetch_headers_bulk(
+                        eligible_uids(),
+                        batch_size=account.server.fetch_batch_size,
+                    )
+                if interactive:
+                    results = map(evaluate_message, message_iter)
+                else:
+                    results = _evaluate_parallel(
+                        evaluate_message, _prefetch_iter(message_iter)
+                    )
+                try:
+                    for uid, subject, body_text, chosen_action in results:
                         # コンソール幅に合わせて件名を短縮（80文字程度）
+                        # subject[60:61] は長さ 61 以上の時のみ非空 (len 呼び出し不要)
                         short_subject = (
-                            subject[:60] + "..." if len(subject) > 60 else subject
+                            subject[:60] + "..." if subject[60:61] else subject
                         )
 
-                        # ルールを順次評価。最初にマッチしたルールの action を適用
-                        chosen_action: Optional[str] = None
-                        for rule in cleanup.rules:
-                            if rule_matches_message(
-                                rule,
-                                subject,
-                                body_text,
-                                body_html,
-                                from_addr,
-                                to_addr,
-                            ):
-                                chosen_action = rule.action or "delete"
-                                break
-
                         if not chosen_action:
                             # 対象外メール
-                            print(
-                                f"\r[SKIP] UID:{uid} {short_subject}",
-                                end="",
-                                flush=True,
-                            )
+                            progress.update(f"[SKIP] UID:{uid} {short_subject}")
                             continue
 
-                        # 対象メールが見つかった場合は行をクリアしてから処理
-                        print("\r" + " " * 80, end="", flush=True)  # 行をクリア
+                        # 対象メールが見つかった場合は進捗行をクリアしてから処理
+                        progress.done()
+
+                        def fetch_full_body(uid=uid):
+                            # d (全文表示) 時のみ RFC822 全体を取り直し、HTML は
+                            # inscriptis で読みやすく整形する
+                            full_msg = client.fetch_message_rfc822(uid)
+                            if full_msg is None:
+                                return None
+                            return rendered_body_text(full_msg)
 
-                        result = _apply_action_for_message(
-                            imap=client,
-                            uid=uid,
+                        result = _confirm_action_for_message(
                             action=chosen_action,
                             trash_mailbox=trash_mailbox,
                             subject=subject,
                             body_text=body_text,
                             interactive=interactive,
+                            fetch_full_body=fetch_full_body if interactive else None,
                         )
-                        counts[result] += 1
+                        if result == "skip":
+                            counts["skip"] += 1
+                        else:
+                            pending[result].append(uid)
 
                         # 結果を表示
                         if result == "trash":
-                            print(f"\r[TRASH] UID:{uid} {short_subject}")
+                            progress.log(f"[TRASH] UID:{uid} {short_subject}")
                         elif result == "delete":
-                            print(f"\r[DELETE] UID:{uid} {short_subject}")
+                            progress.log(f"[DELETE] UID:{uid} {short_subject}")
                         elif result == "skip":
-                            print(f"\r[SKIP] UID:{uid} {short_subject}")
-                        elif result == "error":
-                            print(f"\r[ERROR] UID:{uid} {short_subject}")
-
-                    # 最終行をクリア
-                    print("\r" + " " * 80, end="", flush=True)
-                    print("\r", end="")
+                            progress.log(f"[SKIP] UID:{uid} {short_subject}")
+                finally:
+                    # 例外でループを抜けた場合、先読みスレッドが FETCH の
+                    # 途中のことがある。flush_actions() が同じ接続に STORE を
+                    # 発行する前に results を閉じてスレッド停止まで待つ
+                    close = getattr(results, "close", None)
+                    if close is not None:
+                        close()
+
+                    # 中断 (c) や例外でループを抜けても、確認済みのアクション
+                    # は失わずに発行してから伝播させる
+                    progress.done()
 
                     if total_checked == 0:
                         print("[INFO] No target emails found.")
 
+                    # 溜めたアクションを一括発行
+                    flush_actions()
+
                     # mailbox 単位で expunge（削除・移動が1件以上の時のみ）
                     total_actions = counts["delete"] + counts["trash"]
                     if total_actions > 0:
@@ -282,6 +552,13 @@ def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
         default=30,
         help="Exclude emails received within specified days (default: 30, 0 for all emails)",
     )
+    parser.add_argument(
+        "--max-body-bytes",
+        dest="max_body_bytes",
+        type=int,
+        default=65536,
+        help="Max body bytes decoded per part for rule matching (default: 65536, 0 for unlimited)",
+    )
     return parser.parse_args(argv)
 
 
@@ -290,6 +567,7 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
     config_path = args.config
     interactive: bool = not bool(args.force)  # --force指定時はnon-interactive
     skip_days: int = args.skip_days
+    max_body_bytes: int = args.max_body_bytes
 
     if not os.path.exists(config_path):
         print(f"[ERROR] Config file not found: {config_path}")
@@ -305,18 +583,26 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
         print("[WARN] No valid account settings found. Exiting.")
         return 0
 
-    for account in accounts:
-        try:
-            process_account(account, interactive=interactive, skip_days=skip_days)
-        except ProcessingCanceled:
-            print("[INFO] Processing canceled by user.")
-            return 0
-        except imaplib.IMAP4.error as ex:
-            print(f"[ERROR] IMAP error: {ex}")
-        except Exception:
-            print("[ERROR] Unexpected error occurred")
-            traceback.print_exc()
-            return 2
+    try:
+        for account in accounts:
+            try:
+                process_account(
+                    account,
+                    interactive=interactive,
+                    skip_days=skip_days,
+                    max_body_bytes=max_body_bytes,
+                )
+            except ProcessingCanceled:
+                print("[INFO] Processing canceled by user.")
+                return 0
+            except imaplib.IMAP4.error as ex:
+                print(f"[ERROR] IMAP error: {ex}")
+            except Exception:
+                print("[ERROR] Unexpected error occurred")
+                traceback.print_exc()
+                return 2
+    finally:
+        _close_pooled_clients()
 
     return 0
 
@@ -1,8 +1,40 @@
 from __future__ import annotations
 
+import hashlib
 import json
-from dataclasses import dataclass
-from typing import Any, List, Mapping, Optional, Sequence
+import os
+import pickle
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Mapping, Optional, Sequence, Tuple
+
+# orjson があれば JSON パースに使う (任意依存。標準 json へフォールバック)
+try:
+    import orjson as _orjson  # type: ignore
+except ImportError:
+    _orjson = None
+
+
+# ルール正規表現の共通フラグ (大文字小文字を無視し、. を改行にもマッチさせる)
+RULE_PATTERN_FLAGS = re.IGNORECASE | re.DOTALL
+
+# 正規表現の構文木パーサ (Python 3.11+ では re._parser、それ以前は sre_parse)
+try:
+    from re import _parser as _sre_parse  # type: ignore
+except ImportError:
+    import sre_parse as _sre_parse  # type: ignore
+
+# google-re2 があれば優先して使う (任意依存)。RE2 は DFA ベースで
+# マッチ時間が O(n) に収まるため、config 由来のパターンで破滅的
+# バックトラックが起きない。RE2 が受け付けないパターン (後読み等) は
+# 標準 re にフォールバックする。
+try:
+    import re2 as _re2  # type: ignore
+
+    _RE2_FLAGS = _re2.IGNORECASE | _re2.DOTALL
+except ImportError:
+    _re2 = None
+    _RE2_FLAGS = 0
 
 
 def _ensure_list(value: Any) -> List[str]:
@@ -23,6 +55,128 @@ class ServerConfig:
     ssl: bool
     username: str
     password: str
+    # 1 回の UID FETCH にまとめる件数。大きくするとラウンドトリップは減るが
+    # サーバーのコマンド長制限に引っかかりやすくなる
+    fetch_batch_size: int = 100
+
+
+def _strip_dotstar_wrappers(pattern: str) -> str:
+    """パターン先頭/末尾の冗長な `.*` を取り除く。
+
+    マッチは re.search (部分一致) なので `.*foo.*` は `foo` と等価。
+    ラッパーを外すと re のリテラル接頭辞最適化が効くようになる。
+    末尾側は `\\.*` のようなエスケープ済みドットを壊さないよう
+    後読みで保護する。
+    """
+    p = re.sub(r"^(?:\.\*\??)+", "", pattern)
+    return re.sub(r"(?:(?<!\\)\.\*\??)+$", "", p)
+
+
+def _compile_one_pattern(pattern: str) -> re.Pattern[str]:
+    """1 つのパターンをコンパイルする。re2 があれば優先する。
+
+    re2 が受け付けないパターンは標準 re で再コンパイルする。どちらも
+    受け付けない場合は re.error が伝播する (呼び出し側で警告)。
+    """
+    if _re2 is not None:
+        try:
+            return _re2.compile(pattern, flags=_RE2_FLAGS)
+        except Exception:
+            pass
+    return re.compile(pattern, flags=RULE_PATTERN_FLAGS)
+
+
+def _compile_patterns(patterns: Optional[Sequence[str]]) -> List[re.Pattern[str]]:
+    """パターン文字列のリストをコンパイルする。不正なパターンは警告してスキップ。"""
+    compiled: List[re.Pattern[str]] = []
+    for pat in _ensure_list(patterns):
+        try:
+            compiled.append(_compile_one_pattern(_strip_dotstar_wrappers(pat)))
+        except re.error as ex:
+            print(f"[WARN] Skipped invalid regex pattern: {pat!r} ({ex})")
+    return compiled
+
+
+def _extract_literal(pattern: str) -> Optional[str]:
+    """パターンから必須リテラル部分文字列を取り出す。
+
+    先頭/末尾の `.*` ラッパーを除いた残りがメタ文字を含まない場合のみ、
+    小文字化したリテラルを返す。正規表現を使わない文字列検索
+    (str の in 演算) に使う。
+    """
+    p = _strip_dotstar_wrappers(pattern)
+    if p and re.escape(p) == p:
+        return p.lower()
+    return None
+
+
+def _literal_prefix(pattern: str) -> Optional[str]:
+    """正規表現の先頭リテラル列を取り出す (小文字)。
+
+    構文木の先頭に並ぶ LITERAL ノードはどのマッチにも必ず現れるため、
+    required_literals に加えてプリフィルタに使える。短い接頭辞は選択性が
+    低いので 3 文字以上のみ返す。解析できない場合は None。
+    """
+    try:
+        parsed = _sre_parse.parse(pattern, RULE_PATTERN_FLAGS)
+    except Exception:
+        return None
+    chars: List[str] = []
+    for op, arg in parsed:
+        if str(op) != "LITERAL":
+            break
+        chars.append(chr(arg))
+    prefix = "".join(chars)
+    if len(prefix) >= 3:
+        return prefix.lower()
+    return None
+
+
+def _split_literal_patterns(
+    raw: Optional[Sequence[str]],
+) -> Tuple[List[str], List[re.Pattern[str]]]:
+    """パターン列をリテラル (小文字) と正規表現に振り分ける。
+
+    メタ文字を含まないパターンは str の部分文字列検索で判定できるため
+    正規表現エンジンに渡さない。戻り値は (literals, patterns)。
+    """
+    literals: List[str] = []
+    patterns: List[re.Pattern[str]] = []
+    for pat in _compile_patterns(raw):
+        lit = _extract_literal(pat.pattern)
+        if lit is not None:
+            literals.append(lit)
+        else:
+            patterns.append(pat)
+    return literals, patterns
+
+
+def _combine_patterns(
+    compiled: Sequence[re.Pattern[str]],
+) -> Optional[re.Pattern[str]]:
+    """複数パターンを 1 つのコンパイル済みパターンに結合する。
+
+    フィールド内のパターンは AND 条件 (すべてマッチ) なので、先読み
+    `(?=.*(?:p))` の連結で結合し、テキスト走査を 1 回の match 呼び出しに
+    まとめる。アンカーや後方参照を含むパターンは結合すると意味が変わる
+    ため None を返し、呼び出し側はパターン毎の評価にフォールバックする。
+    """
+    if not compiled:
+        return None
+    if any(not isinstance(p, re.Pattern) for p in compiled):
+        # re2 でコンパイルされたパターンは先読み結合できない (RE2 に
+        # 先読みが無い)。線形時間マッチの利点を優先しパターン毎に評価する
+        return None
+    sources = [p.pattern for p in compiled]
+    for src in sources:
+        # ^ / \A / \1 等は結合で意味が変わるため結合しない
+        if "^" in src or "\\A" in src or re.search(r"\\\d", src):
+            return None
+    try:
+        combined = "".join(f"(?=.*(?:{src}))" for src in sources)
+        return re.compile(combined, flags=RULE_PATTERN_FLAGS)
+    except re.error:
+        return None
 
 
 @dataclass
@@ -32,6 +186,69 @@ class CleanupRule:
     from_addr: Optional[Sequence[str]] = None
     to_addr: Optional[Sequence[str]] = None
     action: str = "delete"
+    # コンパイル済みパターン (config 読み込み時に一度だけ生成し、メッセージ毎の
+    # re.compile 呼び出しを排除する)
+    subject_re: List[re.Pattern[str]] = field(default_factory=list)
+    body_re: List[re.Pattern[str]] = field(default_factory=list)
+    from_re: List[re.Pattern[str]] = field(default_factory=list)
+    to_re: List[re.Pattern[str]] = field(default_factory=list)
+    # フィールド毎の結合パターン (結合できない場合は None のままで
+    # パターン毎の評価にフォールバック)
+    subject_all_re: Optional[re.Pattern[str]] = None
+    body_all_re: Optional[re.Pattern[str]] = None
+    from_all_re: Optional[re.Pattern[str]] = None
+    to_all_re: Optional[re.Pattern[str]] = None
+    # メタ文字を含まないパターンはリテラル (小文字) として分離し、
+    # 正規表現エンジンではなく str の部分文字列検索で判定する
+    subject_lit: List[str] = field(default_factory=list)
+    body_lit: List[str] = field(default_factory=list)
+    from_lit: List[str] = field(default_factory=list)
+    to_lit: List[str] = field(default_factory=list)
+    # 全パターンから抽出した必須リテラル (小文字)。1 つでもメッセージ中に
+    # 無ければこのルールはマッチし得ないため、正規表現評価を丸ごと省ける
+    required_literals: List[str] = field(default_factory=list)
+    # パターン毎評価 (結合パターンが使えない場合のフォールバック) 用に
+    # search の束縛メソッドを保持し、メッセージ毎の属性参照を省く
+    subject_search: List[Callable[[str], Any]] = field(default_factory=list)
+    body_search: List[Callable[[str], Any]] = field(default_factory=list)
+    from_search: List[Callable[[str], Any]] = field(default_factory=list)
+    to_search: List[Callable[[str], Any]] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        if self.subject is not None and not (self.subject_re or self.subject_lit):
+            self.subject_lit, self.subject_re = _split_literal_patterns(self.subject)
+        if self.body is not None and not (self.body_re or self.body_lit):
+            self.body_lit, self.body_re = _split_literal_patterns(self.body)
+        if self.from_addr is not None and not (self.from_re or self.from_lit):
+            self.from_lit, self.from_re = _split_literal_patterns(self.from_addr)
+        if self.to_addr is not None and not (self.to_re or self.to_lit):
+            self.to_lit, self.to_re = _split_literal_patterns(self.to_addr)
+        if self.subject_all_re is None:
+            self.subject_all_re = _combine_patterns(self.subject_re)
+        if self.body_all_re is None:
+            self.body_all_re = _combine_patterns(self.body_re)
+        if self.from_all_re is None:
+            self.from_all_re = _combine_patterns(self.from_re)
+        if self.to_all_re is None:
+            self.to_all_re = _combine_patterns(self.to_re)
+        if not self.required_literals:
+            self.required_literals = (
+                self.subject_lit + self.body_lit + self.from_lit + self.to_lit
+            )
+            # 正規表現パターンからも保証されるリテラル接頭辞を吸い上げる
+            for pats in (self.subject_re, self.body_re, self.from_re, self.to_re):
+                for pat in pats:
+                    prefix = _literal_prefix(pat.pattern)
+                    if prefix is not None:
+                        self.required_literals.append(prefix)
+        if not self.subject_search:
+            self.subject_search = [p.search for p in self.subject_re]
+        if not self.body_search:
+            self.body_search = [p.search for p in self.body_re]
+        if not self.from_search:
+            self.from_search = [p.search for p in self.from_re]
+        if not self.to_search:
+            self.to_search = [p.search for p in self.to_re]
 
 
 @dataclass
@@ -67,9 +284,82 @@ def build_rules(rule_dicts: Sequence[Mapping[str, Any]]) -> List[CleanupRule]:
     return rules
 
 
+# pickle は __post_init__ を経由しないため、AccountConfig / ServerConfig /
+# CleanupRule のフィールド構成を変えたときは必ずこの値を上げること。
+# 不一致の古いキャッシュは破棄して通常の読み込みにフォールバックする
+_ACCOUNTS_CACHE_SCHEMA = 1
+
+
+def _accounts_cache_path(config_path: str) -> str:
+    digest = hashlib.blake2b(
+        os.path.abspath(config_path).encode("utf-8"), digest_size=8
+    ).hexdigest()
+    return os.path.join(
+        os.path.expanduser("~"),
+        ".cache",
+        "imap_mail_cleaner",
+        f"accounts-{digest}.pickle",
+    )
+
+
+def _load_accounts_cache(config_path: str) -> Optional[List[AccountConfig]]:
+    """コンパイル済み AccountConfig の pickle キャッシュを読む。
+
+    config ファイルの mtime_ns / サイズとスキーマ版数が一致する場合のみ
+    有効。パースと正規表現コンパイルを丸ごとスキップできるため、cron 的な
+    繰り返し実行の起動コストを抑える。失敗時は None (通常の読み込みに
+    フォールバック)。
+    """
+    try:
+        st = os.stat(config_path)
+        with open(_accounts_cache_path(config_path), "rb") as f:
+            payload = pickle.load(f)
+        if (
+            isinstance(payload, dict)
+            and payload.get("schema") == _ACCOUNTS_CACHE_SCHEMA
+            and payload.get("mtime_ns") == st.st_mtime_ns
+            and payload.get("size") == st.st_size
+            and isinstance(payload.get("accounts"), list)
+        ):
+            return payload["accounts"]
+    except Exception:
+        pass
+    return None
+
+
+def _save_accounts_cache(config_path: str, accounts: List[AccountConfig]) -> None:
+    # re2 パターン等 pickle できないオブジェクトを含む場合は諦める
+    try:
+        st = os.stat(config_path)
+        path = _accounts_cache_path(config_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            pickle.dump(
+                {
+                    "schema": _ACCOUNTS_CACHE_SCHEMA,
+                    "mtime_ns": st.st_mtime_ns,
+                    "size": st.st_size,
+                    "accounts": accounts,
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        # config.json 同様に認証情報を含むため他ユーザーから読めなくする
+        os.chmod(path, 0o600)
+    except Exception:
+        pass
+
+
 def load_accounts_from_config(config_path: str) -> List[AccountConfig]:
-    with open(config_path, "r", encoding="utf-8") as f:
-        raw = json.load(f)
+    cached = _load_accounts_cache(config_path)
+    if cached is not None:
+        return cached
+    with open(config_path, "rb") as f:
+        raw_bytes = f.read()
+    if _orjson is not None:
+        raw = _orjson.loads(raw_bytes)
+    else:
+        raw = json.loads(raw_bytes.decode("utf-8"))
     if not isinstance(raw, dict):
         raise ValueError("config.json top level must be an object")
     accounts: List[AccountConfig] = []
@@ -86,6 +376,7 @@ def load_accounts_from_config(config_path: str) -> List[AccountConfig]:
             ssl=bool(server_conf.get("ssl", True)),
             username=str(server_conf.get("username", "")),
             password=str(server_conf.get("password", "")),
+            fetch_batch_size=int(server_conf.get("fetch_batch_size", 100)),
         )
         cleanups: List[MailboxCleanup] = []
         for cc in cleanup_conf:
@@ -94,4 +385,5 @@ def load_accounts_from_config(config_path: str) -> List[AccountConfig]:
             rules = build_rules(cc.get("rules", []))
             cleanups.append(MailboxCleanup(mailboxes=mailboxes, rules=rules))
         accounts.append(AccountConfig(name=name, server=server, cleanups=cleanups))
+    _save_accounts_cache(config_path, accounts)
     return accounts
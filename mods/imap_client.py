@@ -1,17 +1,31 @@
 from __future__ import annotations
 
 import imaplib
+import json
+import os
 import re
-from typing import Iterable, List, Optional, Sequence, Tuple
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 import email
 from email import policy
 from email.message import Message
-from email.utils import parsedate_to_datetime
 from datetime import datetime
 
 from mods.config import ServerConfig
 
 
+# メールボックス一覧のディスクキャッシュ。構成はめったに変わらないため、
+# cron/デーモン的な繰り返し実行で LIST/LSUB のラウンドトリップを省く
+_MAILBOX_CACHE_TTL_SECONDS = 24 * 3600
+
+
+def _mailbox_cache_path() -> str:
+    return os.path.join(
+        os.path.expanduser("~"), ".cache", "imap_mail_cleaner", "mailboxes.json"
+    )
+
+
 class ImapClient:
     class MailboxesUnavailable(Exception):
         pass
@@ -20,8 +34,14 @@ class ImapClient:
         self.server: Optional[ServerConfig] = server
         self.conn: Optional[imaplib.IMAP4] = None
         self._mailboxes_cache: List[Tuple[str, str, str]] = []
+        # name -> (flags, delim, name)。存在判定と名前検索を O(1) にする
+        self._mailboxes_by_name: Dict[str, Tuple[str, str, str]] = {}
+        # (flags, delim, name, flags_lower, name_lower)。小文字化は構築時に
+        # 一度だけ行い、Trash 探索時の繰り返し lower() を省く
+        self._mailboxes_norm: List[Tuple[str, str, str, str, str]] = []
         self._selected_mailbox: Optional[str] = None
         self._trash_mailbox_cache: Optional[str] = None
+        self._move_supported: Optional[bool] = None
 
     def __enter__(self) -> "ImapClient":
         return self
@@ -40,10 +60,22 @@ class ImapClient:
                 self.conn.starttls()
         assert self.conn is not None
         self.conn.login(self.server.username, self.server.password)
-        self._load_all_mailboxes()
+        if not self._load_mailboxes_from_disk_cache():
+            self._load_all_mailboxes()
+            self._save_mailboxes_to_disk_cache()
         if not self._mailboxes_cache:
             raise ImapClient.MailboxesUnavailable("Failed to retrieve mailbox list")
 
+    def noop(self) -> bool:
+        """NOOP を発行して接続が生きているか確認する。"""
+        if self.conn is None:
+            return False
+        try:
+            typ, _ = self.conn.noop()
+            return typ == "OK"
+        except Exception:
+            return False
+
     def disconnect(self) -> None:
         try:
             if self.conn is not None:
@@ -54,6 +86,65 @@ class ImapClient:
         finally:
             self.conn = None
 
+    def _disk_cache_key(self) -> Optional[str]:
+        if self.server is None:
+            return None
+        return f"{self.server.host}\n{self.server.username}"
+
+    def _load_mailboxes_from_disk_cache(self) -> bool:
+        """ディスクキャッシュが新しければメールボックス一覧を読み込む。
+
+        TTL 超過・未キャッシュ・読み込み失敗時は False を返し、呼び出し側が
+        LIST/LSUB で取得し直す。Trash 名はキャッシュ済み一覧から同じ手順で
+        導出されるため個別には保存しない。
+        """
+        key = self._disk_cache_key()
+        if key is None:
+            return False
+        try:
+            with open(_mailbox_cache_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entry = data.get(key)
+            if not isinstance(entry, dict):
+                return False
+            cached_at = float(entry.get("cached_at", 0))
+            if time.time() - cached_at > _MAILBOX_CACHE_TTL_SECONDS:
+                return False
+            boxes = [
+                (str(flags), str(delim), str(name))
+                for flags, delim, name in entry.get("mailboxes", [])
+            ]
+            if not boxes:
+                return False
+            self._set_mailboxes(boxes)
+            return True
+        except Exception:
+            return False
+
+    def _save_mailboxes_to_disk_cache(self) -> None:
+        key = self._disk_cache_key()
+        if key is None or not self._mailboxes_cache:
+            return
+        path = _mailbox_cache_path()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data: Dict[str, object] = {}
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, dict):
+                    data = loaded
+            except Exception:
+                pass
+            data[key] = {
+                "cached_at": time.time(),
+                "mailboxes": [list(entry) for entry in self._mailboxes_cache],
+            }
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+        except Exception:
+            pass
+
     def _load_all_mailboxes(self) -> None:
         assert self.conn is not None
         list_data: List[object] = []
@@ -69,18 +160,85 @@ class ImapClient:
                 list_data.extend(data or [])
         except Exception:
             pass
-        self._mailboxes_cache = self._build_mailbox_cache_from_list_data(list_data)
+        self._set_mailboxes(self._build_mailbox_cache_from_list_data(list_data))
+
+    def _set_mailboxes(self, entries: List[Tuple[str, str, str]]) -> None:
+        """メールボックス一覧と name 索引・小文字化済み一覧を同時に更新する。"""
+        self._mailboxes_cache = entries
+        self._mailboxes_by_name = {entry[2]: entry for entry in entries}
+        self._mailboxes_norm = [
+            (flags, delim, name, flags.lower(), name.lower())
+            for flags, delim, name in entries
+        ]
+
+    @staticmethod
+    def _read_imap_astring(text: str, pos: int) -> Tuple[Optional[str], int]:
+        """text[pos:] から quoted string または atom を 1 つ読み取る。
+
+        quoted string は `\\"` エスケープを解釈する (正規表現版は未対応
+        だった)。読み取れない場合は (None, pos) を返す。
+        """
+        n = len(text)
+        while pos < n and text[pos] == " ":
+            pos += 1
+        if pos >= n:
+            return None, pos
+        if text[pos] == '"':
+            buf: List[str] = []
+            pos += 1
+            while pos < n:
+                c = text[pos]
+                if c == "\\" and pos + 1 < n:
+                    buf.append(text[pos + 1])
+                    pos += 2
+                    continue
+                if c == '"':
+                    return "".join(buf), pos + 1
+                buf.append(c)
+                pos += 1
+            return None, pos
+        start = pos
+        while pos < n and text[pos] != " ":
+            pos += 1
+        return text[start:pos], pos
+
+    @staticmethod
+    def _parse_list_line(line: str) -> Optional[Tuple[str, str, str]]:
+        """LIST/LSUB 応答 1 行を (flags, delim, name) に分解する。
+
+        バックトラックし得る正規表現の代わりに 1 パスのトークン走査で
+        解析する。`* LIST` / `* LSUB` の前置きは任意、delim と name は
+        quoted string または atom。解析できない行は None を返す。
+        """
+        s = line.strip()
+        lparen = s.find("(")
+        if lparen < 0:
+            return None
+        prefix = s[:lparen].split()
+        if prefix and not (
+            len(prefix) == 2
+            and prefix[0] == "*"
+            and prefix[1].upper() in ("LIST", "LSUB")
+        ):
+            return None
+        rparen = s.find(")", lparen + 1)
+        if rparen < 0:
+            return None
+        flags = s[lparen + 1 : rparen].strip()
+        delim, pos = ImapClient._read_imap_astring(s, rparen + 1)
+        if delim is None:
+            return None
+        name, pos = ImapClient._read_imap_astring(s, pos)
+        if name is None:
+            return None
+        if s[pos:].strip():
+            return None
+        return flags, delim, name
 
     def _build_mailbox_cache_from_list_data(
         self, list_data: Sequence[object]
     ) -> List[Tuple[str, str, str]]:
-        entries: List[Tuple[str, str, str]] = []
-        regex = re.compile(
-            r"^(?:\*\s+(?:LIST|LSUB)\s+)?\((?P<flags>[^)]*)\)\s+"
-            r"(?:\"(?P<delim_q>[^\"]*)\"|(?P<delim_atom>[^\s]+))\s+"
-            r"(?:\"(?P<name_q>[^\"]*)\"|(?P<name_atom>[^\s]+))\s*$",
-            re.ASCII,
-        )
+        entries_by_name: Dict[str, Tuple[str, str, str]] = {}
         for raw in list_data:
             if raw is None:
                 continue
@@ -96,33 +254,20 @@ class ImapClient:
                 line = b" ".join(parts).decode("utf-8", errors="replace")
             else:
                 line = str(raw)
-            m = regex.match(line.strip())
-            if not m:
+            parsed = self._parse_list_line(line)
+            if parsed is None:
                 continue
-            flags = (m.group("flags") or "").strip()
-            delim = (
-                m.group("delim_q")
-                if m.group("delim_q") is not None
-                else m.group("delim_atom") or "/"
-            )
+            flags, delim, name = parsed
             if delim.upper() == "NIL":
                 delim = "/"
-            name = (
-                m.group("name_q")
-                if m.group("name_q") is not None
-                else m.group("name_atom") or ""
-            )
             if not name or name in {".", "/"} or name == delim:
                 continue
-            entries.append((flags, delim or "/", name))
-        seen: set[str] = set()
-        result: List[Tuple[str, str, str]] = []
-        for flags, delim, name in entries:
-            if name in seen:
-                continue
-            seen.add(name)
-            result.append((flags, delim, name))
-        return result
+            # LIST と LSUB は大きく重複するため、name をキーに 1 パスで
+            # 重複排除する。intern しておくと以降の名前比較が速くなる
+            name = sys.intern(name)
+            if name not in entries_by_name:
+                entries_by_name[name] = (flags, delim or "/", name)
+        return list(entries_by_name.values())
 
     def select_mailbox(self, mailbox: str) -> bool:
         assert self.conn is not None
@@ -135,18 +280,21 @@ class ImapClient:
     def find_trash_mailbox(self) -> Optional[str]:
         if self._trash_mailbox_cache is not None:
             return self._trash_mailbox_cache
-        mailboxes = self._mailboxes_cache
 
         def is_valid(delim: str, name: str) -> bool:
             return bool(name) and name not in {".", "/"} and name != delim
 
-        for flags, delim, name in mailboxes:
-            try:
-                if "\\trash" in flags.lower() and is_valid(delim, name):
-                    self._trash_mailbox_cache = name
-                    return name
-            except Exception:
+        # special-use フラグ (最優先) と名前の部分一致 (最後の手段) を
+        # 1 パスで走査する。小文字化済みフィールドは構築時に計算済み
+        substring_hit: Optional[str] = None
+        for flags, delim, name, flags_lower, name_lower in self._mailboxes_norm:
+            if not is_valid(delim, name):
                 continue
+            if "\\trash" in flags_lower:
+                self._trash_mailbox_cache = name
+                return name
+            if substring_hit is None and "trash" in name_lower:
+                substring_hit = name
         common = [
             "Trash",
             "INBOX.Trash",
@@ -157,22 +305,36 @@ class ImapClient:
             "ゴミ箱",
             "ごみ箱",
         ]
-        existing = {(d, n) for _, d, n in mailboxes}
         for cn in common:
-            for delim, name in existing:
-                if name == cn and is_valid(delim, name):
+            entry = self._mailboxes_by_name.get(cn)
+            if entry is not None:
+                _, delim, name = entry
+                if is_valid(delim, name):
                     self._trash_mailbox_cache = name
                     return name
-        for _, delim, name in mailboxes:
-            if "trash" in name.lower() and is_valid(delim, name):
-                self._trash_mailbox_cache = name
-                return name
+        if substring_hit is not None:
+            self._trash_mailbox_cache = substring_hit
+            return substring_hit
         self._trash_mailbox_cache = None
         return None
 
     def mailbox_exists(self, requested: str) -> bool:
-        names = [name for _, _, name in self._mailboxes_cache]
-        return requested in names
+        return requested in self._mailboxes_by_name
+
+    def ensure_mailbox_known(self, requested: str) -> bool:
+        """mailbox の存在を確認し、未知なら一覧をサーバーから取り直す。
+
+        ディスクキャッシュは最長 24 時間古いため、キャッシュ後に作成された
+        mailbox が載っていないことがある。キャッシュに無い場合のみ LIST/LSUB
+        を再発行し、取り直した一覧でディスクキャッシュも更新する。
+        """
+        if requested in self._mailboxes_by_name:
+            return True
+        self._load_all_mailboxes()
+        self._save_mailboxes_to_disk_cache()
+        # 一覧が変わったので Trash の判定もやり直せるようにする
+        self._trash_mailbox_cache = None
+        return requested in self._mailboxes_by_name
 
     def _get_uidnext_for_selected(self) -> Optional[int]:
         assert self.conn is not None
@@ -183,19 +345,62 @@ class ImapClient:
             if typ != "OK" or not data:
                 return None
             first = data[0]
-            text = (
-                first.decode(errors="replace")
+            buf = (
+                bytes(first)
                 if isinstance(first, (bytes, bytearray))
-                else str(first)
+                else str(first).encode("ascii", errors="replace")
             )
-            m = re.search(r"UIDNEXT\s+(\d+)", text)
-            if m:
-                return int(m.group(1))
+            # デコードも正規表現も使わず "UIDNEXT " 直後の数字列を読む
+            idx = buf.find(b"UIDNEXT ")
+            if idx >= 0:
+                pos = idx + 8
+                end = pos
+                n = len(buf)
+                while end < n and 0x30 <= buf[end] <= 0x39:
+                    end += 1
+                if end > pos:
+                    return int(buf[pos:end])
         except Exception:
             return None
         return None
 
-    def iter_all_uids(self, chunk_size: int = 5000) -> Iterable[str]:
+    # IMAP の日付はロケール非依存の英語月名で組み立てる必要がある
+    _IMAP_MONTHS = (
+        "Jan",
+        "Feb",
+        "Mar",
+        "Apr",
+        "May",
+        "Jun",
+        "Jul",
+        "Aug",
+        "Sep",
+        "Oct",
+        "Nov",
+        "Dec",
+    )
+
+    @classmethod
+    def _imap_date(cls, dt: datetime) -> str:
+        return f"{dt.day:02d}-{cls._IMAP_MONTHS[dt.month - 1]}-{dt.year}"
+
+    def iter_all_uids(self, chunk_size: int = 5000) -> Iterable[int]:
+        return self._iter_uids_matching((), chunk_size)
+
+    def search_uids_before(
+        self, before: datetime, chunk_size: int = 5000
+    ) -> Iterable[int]:
+        """INTERNALDATE が指定日より前のメッセージの UID を列挙する。
+
+        UID SEARCH BEFORE でサーバー側に日付フィルタを任せるため、
+        メッセージ毎に受信日時を FETCH するラウンドトリップが不要になる。
+        BEFORE は日単位の比較 (当日を含まない) である点に注意。
+        """
+        return self._iter_uids_matching(("BEFORE", self._imap_date(before)), chunk_size)
+
+    def _iter_uids_matching(
+        self, criteria: Sequence[str], chunk_size: int = 5000
+    ) -> Iterable[int]:
         assert self.conn is not None
         uidnext = self._get_uidnext_for_selected()
         if uidnext and uidnext > 1:
@@ -203,99 +408,539 @@ class ImapClient:
             while start < uidnext:
                 end = min(start + chunk_size - 1, uidnext - 1)
                 try:
-                    typ, data = self.conn.uid("SEARCH", "UID", f"{start}:{end}")
+                    typ, data = self.conn.uid(
+                        "SEARCH", "UID", f"{start}:{end}", *criteria
+                    )
                 except Exception:
                     data = None
                     typ = "NO"
                 if typ == "OK" and data:
+                    # SEARCH 応答はスペース区切りの ASCII 数字列。バッファ
+                    # 全体を str にデコードせず bytes のまま分割し、UID
+                    # 単位の小さなトークンだけデコードする
                     first = data[0]
-                    text = (
-                        first.decode(errors="replace")
-                        if isinstance(first, (bytes, bytearray))
-                        else str(first)
-                    )
-                    for uid in text.split():
-                        if uid:
-                            yield uid
+                    if isinstance(first, (bytes, bytearray)):
+                        # int() は bytes を直接受けるためデコード自体が不要
+                        for tok in first.split():
+                            yield int(tok)
+                    elif first:
+                        for uid in str(first).split():
+                            yield int(uid)
                 start = end + 1
             return
         try:
-            typ, data = self.conn.uid("SEARCH", "ALL")
+            typ, data = self.conn.uid("SEARCH", *(criteria or ("ALL",)))
             if typ == "OK" and data and data[0]:
                 first = data[0]
-                text = (
-                    first.decode(errors="replace")
-                    if isinstance(first, (bytes, bytearray))
-                    else str(first)
-                )
-                for uid in text.split():
-                    if uid:
-                        yield uid
+                if isinstance(first, (bytes, bytearray)):
+                    for tok in first.split():
+                        yield int(tok)
+                else:
+                    for uid in str(first).split():
+                        yield int(uid)
         except Exception:
             return
 
-    def fetch_message_rfc822(self, uid: str) -> Optional[Message]:
+    def fetch_message_rfc822(self, uid: int) -> Optional[Message]:
         assert self.conn is not None
-        typ, data = self.conn.uid("FETCH", uid, "(RFC822)")
+        typ, data = self.conn.uid("FETCH", str(uid), "(RFC822)")
         if typ != "OK" or not data:
             return None
         for item in data:
             if isinstance(item, tuple) and len(item) >= 2:
-                seq = list(item)
-                second = seq[1]
+                second = item[1]
                 if isinstance(second, (bytes, bytearray)):
-                    raw_bytes = bytes(second)
+                    # imaplib のバッファをコピーせずそのままパーサへ渡す
                     try:
                         return email.message_from_bytes(
-                            raw_bytes, policy=policy.default
+                            second, policy=policy.default
                         )
                     except Exception:
-                        return email.message_from_bytes(raw_bytes)
+                        return email.message_from_bytes(second)
         return None
 
-    def fetch_message_date(self, uid: str) -> Optional[datetime]:
-        """指定されたUIDのメッセージの受信日時を取得する。
+    def fetch_messages_bulk(
+        self, uids: Iterable[int], batch_size: int = 100
+    ) -> Iterator[Tuple[int, Message]]:
+        """UID をまとめて FETCH し、(uid, Message) を順に返すジェネレータ。
 
-        INTERNALDATEを使用してサーバー側の受信日時を取得します。
-        取得できない場合はNoneを返します。
+        1 UID = 1 コマンドだとメッセージ数分のラウンドトリップが発生するため、
+        batch_size 件ずつカンマ区切りの UID リストで 1 回の UID FETCH に
+        まとめる (リストを長くしすぎるとサーバー側でリクエストサイズ超過に
+        なるため既定は 100 件)。応答の UID はサーバーが付与する UID 項目から
+        取り出すので、応答順や欠落 (expunge 済み等) に依存しない。
         """
         assert self.conn is not None
-        try:
-            typ, data = self.conn.uid("FETCH", uid, "(INTERNALDATE)")
-            if typ != "OK" or not data:
-                return None
-            for item in data:
-                if isinstance(item, bytes):
-                    text = item.decode(errors="replace")
-                elif isinstance(item, str):
-                    text = item
-                else:
+        batch: List[int] = []
+        for uid in uids:
+            batch.append(uid)
+            if len(batch) >= batch_size:
+                yield from self._fetch_message_batch(batch)
+                batch = []
+        if batch:
+            yield from self._fetch_message_batch(batch)
+
+    def _fetch_message_batch(
+        self, batch: Sequence[int]
+    ) -> Iterator[Tuple[int, Message]]:
+        """バッチ 1 つ分のメッセージを取得する。
+
+        まず BODYSTRUCTURE でバッチを分類し、添付等の非テキストパートを
+        含むメッセージはヘッダ + text/* セクションのみを取得して転送量を
+        抑える。テキストのみのメッセージ (削れるバイトが無い) や
+        BODYSTRUCTURE を解釈できなかったメッセージは従来どおり RFC822
+        全体をまとめて取得する。
+        """
+        structures = self._fetch_bodystructures(batch)
+        full_uids: List[int] = []
+        partial: List[Tuple[int, List[Tuple[str, str, str, str]]]] = []
+        for uid in batch:
+            info = structures.get(uid)
+            if info is None:
+                full_uids.append(uid)
+                continue
+            text_parts, has_other = info
+            if has_other and text_parts:
+                partial.append((uid, text_parts))
+            else:
+                full_uids.append(uid)
+        if full_uids:
+            yield from self._fetch_full_batch(full_uids)
+        for uid, text_parts in partial:
+            msg = self._fetch_message_text_sections(uid, text_parts)
+            if msg is None:
+                # パート取得に失敗した場合は全体取得にフォールバック
+                msg = self.fetch_message_rfc822(uid)
+            if msg is not None:
+                yield uid, msg
+
+    # ルール判定に使うヘッダのみ。DATE は表示/将来のフィルタ用に含める
+    _HEADER_FIELDS_ITEM = "BODY.PEEK[HEADER.FIELDS (SUBJECT FROM TO DATE)]"
+
+    def fetch_headers_bulk(
+        self, uids: Iterable[int], batch_size: int = 100
+    ) -> Iterator[Tuple[int, Message]]:
+        """ヘッダフィールドのみをまとめて FETCH するジェネレータ。
+
+        body を参照しないルールしか無い場合、RFC822 全体 (数十 KB〜) では
+        なく SUBJECT/FROM/TO/DATE (1KB 程度) の転送で済む。返す Message は
+        本文を持たないが、message_fields() はそのまま処理できる
+        (body_text は空になる)。
+        """
+        assert self.conn is not None
+        batch: List[int] = []
+        for uid in uids:
+            batch.append(uid)
+            if len(batch) >= batch_size:
+                yield from self._fetch_header_batch(batch)
+                batch = []
+        if batch:
+            yield from self._fetch_header_batch(batch)
+
+    def _fetch_header_batch(
+        self, batch: Sequence[int]
+    ) -> Iterator[Tuple[int, Message]]:
+        assert self.conn is not None
+        # 接続断等の imaplib エラーは握りつぶさず伝播させる (静かに途中
+        # 終了すると処理済みに見えてしまう)
+        typ, data = self.conn.uid(
+            "FETCH", ",".join(map(str, batch)), f"(UID {self._HEADER_FIELDS_ITEM})"
+        )
+        if typ != "OK" or not data:
+            return
+        for item in data:
+            if not (isinstance(item, tuple) and len(item) >= 2):
+                continue
+            meta, payload = item[0], item[1]
+            if not isinstance(payload, (bytes, bytearray)):
+                continue
+            meta_bytes = (
+                bytes(meta)
+                if isinstance(meta, (bytes, bytearray))
+                else str(meta).encode("ascii", errors="replace")
+            )
+            m = re.search(rb"UID (\d+)", meta_bytes)
+            if not m:
+                continue
+            uid = int(m.group(1))
+            try:
+                msg = self._parse_header_fields(payload)
+            except Exception:
+                continue
+            yield uid, msg
+
+    @staticmethod
+    def _parse_header_fields(block: bytes) -> Message:
+        """HEADER.FIELDS 応答のヘッダブロックを専用の軽量パーサで読む。
+
+        要求するフィールドは常に同じ少数なので、汎用の email パーサを
+        通さず行分割と折り返し行の結合だけで Message に詰める。encoded
+        word のデコードは message_fields 側 (ASCII 高速パス + キャッシュ
+        付き) が行うため、ここでは生の値のまま保持する。
+        """
+        msg = Message()
+        name: Optional[str] = None
+        value_parts: List[str] = []
+        for line in block.split(b"\r\n"):
+            if not line:
+                continue
+            if line[:1] in (b" ", b"\t"):
+                # 折り返し行 (先頭が空白) は直前のフィールドの続き
+                if name is not None:
+                    value_parts.append(
+                        line.decode("utf-8", errors="replace").strip()
+                    )
+                continue
+            if name is not None:
+                msg[name] = " ".join(value_parts)
+            idx = line.find(b":")
+            if idx <= 0:
+                name = None
+                value_parts = []
+                continue
+            name = line[:idx].decode("ascii", errors="replace")
+            value_parts = [line[idx + 1 :].decode("utf-8", errors="replace").strip()]
+        if name is not None:
+            msg[name] = " ".join(value_parts)
+        return msg
+
+    def _fetch_full_batch(
+        self, batch: Sequence[int]
+    ) -> Iterator[Tuple[int, Message]]:
+        assert self.conn is not None
+        # 接続断等の imaplib エラーは伝播させる (fetch_message_rfc822 と同様)
+        typ, data = self.conn.uid(
+            "FETCH", ",".join(map(str, batch)), "(UID RFC822)"
+        )
+        if typ != "OK" or not data:
+            return
+        for item in data:
+            if not (isinstance(item, tuple) and len(item) >= 2):
+                continue
+            meta, payload = item[0], item[1]
+            if not isinstance(payload, (bytes, bytearray)):
+                continue
+            meta_bytes = (
+                bytes(meta)
+                if isinstance(meta, (bytes, bytearray))
+                else str(meta).encode("ascii", errors="replace")
+            )
+            m = re.search(rb"UID (\d+)", meta_bytes)
+            if not m:
+                continue
+            uid = int(m.group(1))
+            try:
+                msg = email.message_from_bytes(payload, policy=policy.default)
+            except Exception:
+                try:
+                    msg = email.message_from_bytes(payload)
+                except Exception:
                     continue
+            yield uid, msg
 
-                # INTERNALDATE のパース: UID 123 (INTERNALDATE "17-Jan-2002 16:00:00 +0900")
-                m = re.search(r'INTERNALDATE\s+"([^"]+)"', text)
-                if m:
-                    date_str = m.group(1)
-                    try:
-                        # INTERNALDATE format: "DD-Mon-YYYY HH:MM:SS +HHMM"
-                        dt = parsedate_to_datetime(date_str)
-                        return dt
-                    except Exception:
-                        return None
+    # ------------------------------
+    # BODYSTRUCTURE ベースの部分取得
+    # ------------------------------
+
+    @staticmethod
+    def _parse_imap_list(text: str, pos: int) -> Tuple[object, int]:
+        """IMAP の括弧リストを 1 要素パースする (quoted string / atom / NIL / 入れ子)。
+
+        リテラル ({n} 構文) を含む応答はサポート外で ValueError を送出する。
+        呼び出し側は全体取得にフォールバックする。
+        """
+        n = len(text)
+        while pos < n and text[pos] == " ":
+            pos += 1
+        if pos >= n:
+            raise ValueError("unexpected end of BODYSTRUCTURE")
+        ch = text[pos]
+        if ch == "(":
+            items: List[object] = []
+            pos += 1
+            while True:
+                while pos < n and text[pos] == " ":
+                    pos += 1
+                if pos >= n:
+                    raise ValueError("unbalanced parenthesis in BODYSTRUCTURE")
+                if text[pos] == ")":
+                    return items, pos + 1
+                item, pos = ImapClient._parse_imap_list(text, pos)
+                items.append(item)
+        if ch == '"':
+            buf: List[str] = []
+            pos += 1
+            while pos < n:
+                c = text[pos]
+                if c == "\\" and pos + 1 < n:
+                    buf.append(text[pos + 1])
+                    pos += 2
+                    continue
+                if c == '"':
+                    return "".join(buf), pos + 1
+                buf.append(c)
+                pos += 1
+            raise ValueError("unterminated quoted string in BODYSTRUCTURE")
+        if ch == "{":
+            raise ValueError("literal in BODYSTRUCTURE is not supported")
+        start = pos
+        while pos < n and text[pos] not in ' ()"':
+            pos += 1
+        atom = text[start:pos]
+        if not atom:
+            raise ValueError("empty atom in BODYSTRUCTURE")
+        return (None if atom.upper() == "NIL" else atom), pos
+
+    @staticmethod
+    def _collect_text_parts(
+        bs: object, section_prefix: str, out: List[Tuple[str, str, str, str]]
+    ) -> bool:
+        """BODYSTRUCTURE の木を辿り text/* パートを収集する。
+
+        out には (セクション番号, subtype, charset, encoding) を追加する。
+        戻り値は「非テキストパートが存在するか」。
+        """
+        if not isinstance(bs, list) or not bs:
+            return True
+        if isinstance(bs[0], list):
+            # multipart: 先頭に並ぶリストが子パート、その後に subtype が続く
+            has_other = False
+            index = 0
+            for child in bs:
+                if not isinstance(child, list):
+                    break
+                index += 1
+                has_other |= ImapClient._collect_text_parts(
+                    child, f"{section_prefix}{index}.", out
+                )
+            return has_other
+        mime_type = bs[0] if isinstance(bs[0], str) else ""
+        if mime_type.lower() != "text" or len(bs) < 7:
+            return True
+        subtype = bs[1] if isinstance(bs[1], str) else "plain"
+        charset = ""
+        params = bs[2]
+        if isinstance(params, list):
+            for i in range(0, len(params) - 1, 2):
+                key = params[i]
+                if isinstance(key, str) and key.lower() == "charset":
+                    value = params[i + 1]
+                    if isinstance(value, str):
+                        charset = value
+        encoding = bs[5] if isinstance(bs[5], str) else ""
+        section = section_prefix[:-1] if section_prefix else "1"
+        out.append((section, subtype, charset, encoding))
+        return False
+
+    def _fetch_bodystructures(
+        self, batch: Sequence[int]
+    ) -> Dict[int, Tuple[List[Tuple[str, str, str, str]], bool]]:
+        """バッチの BODYSTRUCTURE を一括取得して解析する。
+
+        戻り値は uid -> (text_parts, has_other)。解析できなかった UID は
+        含まれない (呼び出し側が全体取得にフォールバックする)。
+        """
+        assert self.conn is not None
+        result: Dict[int, Tuple[List[Tuple[str, str, str, str]], bool]] = {}
+        try:
+            typ, data = self.conn.uid(
+                "FETCH", ",".join(map(str, batch)), "(UID BODYSTRUCTURE)"
+            )
+        except Exception:
+            return result
+        if typ != "OK" or not data:
+            return result
+        for item in data:
+            if isinstance(item, (bytes, bytearray)):
+                line = bytes(item).decode("utf-8", errors="replace")
+            elif isinstance(item, tuple):
+                # リテラル入り応答はサポート外 (全体取得にフォールバック)
+                continue
+            else:
+                continue
+            m = re.search(r"UID (\d+)", line)
+            idx = line.find("BODYSTRUCTURE")
+            if not m or idx < 0:
+                continue
+            paren = line.find("(", idx)
+            if paren < 0:
+                continue
+            try:
+                bs, _ = self._parse_imap_list(line, paren)
+            except ValueError:
+                continue
+            text_parts: List[Tuple[str, str, str, str]] = []
+            has_other = self._collect_text_parts(bs, "", text_parts)
+            result[int(m.group(1))] = (text_parts, has_other)
+        return result
+
+    def _fetch_message_text_sections(
+        self, uid: int, text_parts: Sequence[Tuple[str, str, str, str]]
+    ) -> Optional[Message]:
+        """ヘッダと text/* セクションのみ取得し Message に再構成する。
+
+        添付を含むメッセージでも本文判定に必要な部分だけを転送する。
+        再構成したメッセージは message_fields() がそのまま処理できる。
+        """
+        assert self.conn is not None
+        items = ["BODY.PEEK[HEADER]"]
+        items.extend(f"BODY.PEEK[{section}]" for section, _, _, _ in text_parts)
+        try:
+            typ, data = self.conn.uid("FETCH", str(uid), "(" + " ".join(items) + ")")
         except Exception:
             return None
-        return None
+        if typ != "OK" or not data:
+            return None
+        sections: Dict[str, bytes] = {}
+        for item in data:
+            if not (isinstance(item, tuple) and len(item) >= 2):
+                continue
+            meta, payload = item[0], item[1]
+            if not isinstance(payload, (bytes, bytearray)):
+                continue
+            meta_bytes = (
+                bytes(meta)
+                if isinstance(meta, (bytes, bytearray))
+                else str(meta).encode("ascii", errors="replace")
+            )
+            sm = re.search(rb"BODY\[([^\]]*)\]", meta_bytes)
+            if sm:
+                sections[sm.group(1).decode("ascii")] = payload
+        header_bytes = sections.get("HEADER")
+        if header_bytes is None:
+            return None
+        try:
+            outer = email.message_from_bytes(header_bytes, policy=policy.default)
+        except Exception:
+            try:
+                outer = email.message_from_bytes(header_bytes)
+            except Exception:
+                return None
+        subparts: List[Message] = []
+        for section, subtype, charset, encoding in text_parts:
+            raw = sections.get(section)
+            if raw is None:
+                continue
+            part = Message()
+            content_type = f'text/{subtype.lower() or "plain"}'
+            if charset:
+                content_type += f'; charset="{charset}"'
+            part["Content-Type"] = content_type
+            if encoding:
+                part["Content-Transfer-Encoding"] = encoding
+            # CTE 適用済みのペイロードは latin-1 で可逆に str 化できる
+            part.set_payload(raw.decode("latin-1"))
+            subparts.append(part)
+        if not subparts:
+            return None
+        outer.set_payload(subparts)
+        return outer
+
+    @staticmethod
+    def build_sequence_set(uids: Sequence[int]) -> str:
+        """UID 列を IMAP のシーケンスセット表記に圧縮する。
+
+        連番は範囲にまとめ、"10:25,30,42:50" のような形式を返す。
+        コマンド行を短く保つことで 1 コマンドあたりの UID 件数を増やせる。
+        """
+        numbers = sorted(set(uids))
+        parts: List[str] = []
+        i = 0
+        n = len(numbers)
+        while i < n:
+            j = i
+            while j + 1 < n and numbers[j + 1] == numbers[j] + 1:
+                j += 1
+            if j > i:
+                parts.append(f"{numbers[i]}:{numbers[j]}")
+            else:
+                parts.append(str(numbers[i]))
+            i = j + 1
+        return ",".join(parts)
+
+    def supports_move(self) -> bool:
+        """サーバーが RFC 6851 の MOVE 拡張を広告しているか。
+
+        imaplib の capabilities 属性は認証前のグリーティング時点の値の
+        ままで、MOVE を認証後にのみ広告するサーバー (Gmail 等) を取り
+        こぼす。そのため LOGIN 後に CAPABILITY を一度発行して判定し、
+        結果をキャッシュする。
+        """
+        if self._move_supported is None:
+            assert self.conn is not None
+            caps: Sequence[object] = ()
+            try:
+                typ, data = self.conn.capability()
+                if typ == "OK" and data and data[0]:
+                    caps = data[0].split()
+            except Exception:
+                # CAPABILITY に失敗した場合のみグリーティング時の値に頼る
+                caps = getattr(self.conn, "capabilities", None) or ()
+            names = {
+                c.decode("ascii", errors="replace").upper()
+                if isinstance(c, (bytes, bytearray))
+                else str(c).upper()
+                for c in caps
+            }
+            self._move_supported = "MOVE" in names
+        return self._move_supported
+
+    def move_to_mailbox(self, uids: Sequence[int], mailbox: str) -> bool:
+        """UID MOVE で複数メッセージをまとめて移動する。
+
+        COPY → \\Deleted → EXPUNGE の 3 コマンドを 1 コマンドに置き換える。
+        コマンド長超過を避けるため UID リストは 1000 件ずつに分割する。
+        supports_move() が真の場合のみ呼び出すこと。
+        """
+        assert self.conn is not None
+        # 古い Python の imaplib には MOVE が未登録のことがある
+        imaplib.Commands.setdefault("MOVE", ("SELECTED",))
+        quoted = f'"{mailbox}"'
+        ok = True
+        for start in range(0, len(uids), 1000):
+            chunk = uids[start : start + 1000]
+            try:
+                typ, _ = self.conn.uid(
+                    "MOVE", self.build_sequence_set(chunk), quoted
+                )
+            except Exception:
+                return False
+            ok = ok and typ == "OK"
+        return ok
 
-    def copy_to_mailbox(self, uid: str, mailbox: str) -> bool:
+    def copy_to_mailbox_bulk(self, uids: Sequence[int], mailbox: str) -> bool:
+        """UID COPY を UID セットでまとめて発行する。"""
         assert self.conn is not None
         quoted = f'"{mailbox}"'
-        typ, _ = self.conn.uid("COPY", uid, quoted)
-        return typ == "OK"
+        ok = True
+        for start in range(0, len(uids), 1000):
+            chunk = uids[start : start + 1000]
+            try:
+                typ, _ = self.conn.uid(
+                    "COPY", self.build_sequence_set(chunk), quoted
+                )
+            except Exception:
+                return False
+            ok = ok and typ == "OK"
+        return ok
 
-    def mark_deleted(self, uid: str) -> bool:
+    def mark_deleted_bulk(self, uids: Sequence[int]) -> bool:
+        """UID STORE +FLAGS \\Deleted を UID セットでまとめて発行する。"""
         assert self.conn is not None
-        typ, _ = self.conn.uid("STORE", uid, "+FLAGS.SILENT", "(\\Deleted)")
-        return typ == "OK"
+        ok = True
+        for start in range(0, len(uids), 1000):
+            chunk = uids[start : start + 1000]
+            try:
+                typ, _ = self.conn.uid(
+                    "STORE",
+                    self.build_sequence_set(chunk),
+                    "+FLAGS.SILENT",
+                    "(\\Deleted)",
+                )
+            except Exception:
+                return False
+            ok = ok and typ == "OK"
+        return ok
 
     def expunge(self) -> None:
         assert self.conn is not None
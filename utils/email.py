@@ -3,6 +3,7 @@ Email sending utilities for the reservation app.
 """
 
 import re
+from functools import lru_cache
 from typing import Dict
 
 from inscriptis import get_annotated_text
@@ -12,31 +13,40 @@ from inscriptis.model.html_document_state import HtmlDocumentState
 from inscriptis.css_profiles import CSS_PROFILES, HtmlElement
 
 
+# カスタムハンドラの定義
+def _a_start_handler(state: HtmlDocumentState, attrs: Dict) -> None:
+    state.link_target = ""
+    state.link_target = attrs.get("href", "")
+
+    if state.link_target:
+        state.tags[-1].write("[")
+
+
+def _a_end_handler(state: HtmlDocumentState) -> None:
+    if state.link_target:
+        state.tags[-1].write(f"]({state.link_target})")
+
+
+# ParserConfig 一式は不変なのでモジュール読み込み時に一度だけ構築する
+# config = ParserConfig(display_links=True, annotation_rules={"a": ["link"]})
+_css = CSS_PROFILES["strict"].copy()
+_css["body"] = HtmlElement(margin_before=0)
+_custom_mapping = CustomHtmlTagHandlerMapping(start_tag_mapping={"a": _a_start_handler}, end_tag_mapping={"a": _a_end_handler})
+_annotation_rules = {"a": ["link"]}
+_parser_config = ParserConfig(css=_css, custom_html_tag_handler_mapping=_custom_mapping, annotation_rules=_annotation_rules)
+
+
+@lru_cache(maxsize=512)
 def convert_html_to_text(html_message: str) -> str:
     """
     HTMLメール文章をテキストに変換します。
-    """
-
-    # カスタムハンドラの定義
-    def a_start_handler(state: HtmlDocumentState, attrs: Dict) -> None:
-        state.link_target = ""
-        state.link_target = attrs.get("href", "")
 
-        if state.link_target:
-            state.tags[-1].write("[")
-
-    def a_end_handler(state: HtmlDocumentState) -> None:
-        if state.link_target:
-            state.tags[-1].write(f"]({state.link_target})")
+    同一テンプレートのニュースレター等で HTML が完全一致することが多いため
+    変換結果を LRU キャッシュします。
+    """
 
     # inscriptisで変換
-    # config = ParserConfig(display_links=True, annotation_rules={"a": ["link"]})
-    css = CSS_PROFILES["strict"].copy()
-    css["body"] = HtmlElement(margin_before=0)
-    custom_mapping = CustomHtmlTagHandlerMapping(start_tag_mapping={"a": a_start_handler}, end_tag_mapping={"a": a_end_handler})
-    annotation_rules = {"a": ["link"]}
-    config = ParserConfig(css=css, custom_html_tag_handler_mapping=custom_mapping, annotation_rules=annotation_rules)
-    result = get_annotated_text(html_message, config)
+    result = get_annotated_text(html_message, _parser_config)
     text_message = result["text"]
 
     # 置換リスト作成
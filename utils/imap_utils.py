@@ -1,29 +1,98 @@
 """Regular expression utilities for pattern matching."""
 
 import re
-from typing import List, Optional, Sequence, Any, Tuple
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Tuple
 from email.message import Message
 from email.header import decode_header
 
 from mods.config import CleanupRule
 from utils.email import convert_html_to_text
 
+# Cheap HTML-to-text for rule matching: drop script/style blocks, then
+# replace tags and entities with spaces. The full inscriptis renderer (a
+# pure-Python DOM walk) is reserved for bodies a human actually reads.
+_HTML_DROP_RE = re.compile(
+    r"<(?:script|style)\b.*?</(?:script|style)\s*>", re.IGNORECASE | re.DOTALL
+)
+_HTML_TAG_RE = re.compile(r"<[^>]+>|&#?\w+;")
 
-def _compile_patterns(patterns: Optional[Sequence[str]]) -> List[re.Pattern[str]]:
-    """Compile a list of regex patterns, skipping invalid ones."""
-    compiled: List[re.Pattern[str]] = []
-    for pat in _ensure_list(patterns):
-        try:
-            compiled.append(re.compile(pat, flags=re.IGNORECASE | re.DOTALL))
-        except re.error as ex:
-            print(f"[WARN] Skipped invalid regex pattern: {pat!r} ({ex})")
-    return compiled
+
+def _strip_html_tags(html: str) -> str:
+    """Strip tags and entities from HTML for regex matching purposes."""
+    return _HTML_TAG_RE.sub(" ", _HTML_DROP_RE.sub(" ", html))
+
+
+def _render_html(html: str) -> str:
+    """Full HTML-to-text rendering, falling back to tag stripping."""
+    try:
+        return convert_html_to_text(html)
+    except Exception:
+        return _strip_html_tags(html)
 
 
-def _match_all(patterns: List[re.Pattern[str]], value: str) -> bool:
-    """Check if all patterns match the given value."""
-    for pat in patterns:
-        if not pat.search(value):
+def _match_all(searches: List[Callable[[str], Any]], value: str) -> bool:
+    """Check if all patterns match the given value.
+
+    Takes the bound pat.search methods cached on the rule at config load,
+    saving an attribute lookup per pattern per message.
+    """
+    for search in searches:
+        if not search(value):
+            return False
+    return True
+
+
+def _field_matches(
+    literals: List[str],
+    searches: List[Callable[[str], Any]],
+    combined: Optional[re.Pattern[str]],
+    value: str,
+) -> bool:
+    """Check one field against its literals and patterns (all must match).
+
+    Literal patterns use a lowercased substring scan (much faster than the
+    regex engine for plain strings). Remaining regexes use the combined
+    lookahead pattern built at config load when available (single scan),
+    falling back to per-pattern evaluation otherwise.
+    """
+    if literals:
+        lowered = value.lower()
+        for lit in literals:
+            if lit not in lowered:
+                return False
+    if combined is not None:
+        # The combined pattern is a chain of lookaheads; anchoring with
+        # match() is correct and avoids re-trying at every position.
+        return combined.match(value) is not None
+    return _match_all(searches, value)
+
+
+def prescreen_haystack(
+    subject: str,
+    body_text: str,
+    body_html: Optional[str],
+    from_addr: str,
+    to_addr: str,
+) -> str:
+    """Build the lowercased haystack used by rule_prescreen.
+
+    Built once per message and shared across all rules, so the regex engine
+    only runs for rules whose required literals are actually present.
+    """
+    return "\n".join((subject, from_addr, to_addr, body_text, body_html or "")).lower()
+
+
+def rule_prescreen(rule: CleanupRule, haystack: str) -> bool:
+    """Cheap literal containment prefilter for a rule.
+
+    Returns False when one of the rule's required literals is absent from the
+    message, in which case the rule cannot match and the regex evaluation can
+    be skipped entirely. str.__contains__ is a C-level substring scan, far
+    cheaper than running each compiled pattern.
+    """
+    for lit in rule.required_literals:
+        if lit not in haystack:
             return False
     return True
 
@@ -36,49 +105,63 @@ def rule_matches_message(
     from_addr: str,
     to_addr: str,
 ) -> bool:
-    """Check if a cleanup rule matches the given message fields."""
-    subject_patterns = (
-        _compile_patterns(rule.subject) if rule.subject is not None else []
-    )
-    body_patterns = _compile_patterns(rule.body) if rule.body is not None else []
-    from_patterns = (
-        _compile_patterns(rule.from_addr) if rule.from_addr is not None else []
-    )
-    to_patterns = _compile_patterns(rule.to_addr) if rule.to_addr is not None else []
-
-    # Each field specified must satisfy ALL of its patterns
-    if subject_patterns and not _match_all(subject_patterns, subject):
+    """Check if a cleanup rule matches the given message fields.
+
+    Patterns are precompiled on the rule at config-load time; no compilation
+    happens here.
+    """
+    # Each field specified must satisfy ALL of its patterns.
+    # Fields are AND-combined, so evaluate the cheapest (shortest) ones first:
+    # from/to/subject are tens of bytes while the body can be megabytes, and
+    # most messages fail a rule, ideally before the body is ever scanned.
+    if (rule.from_re or rule.from_lit) and not _field_matches(
+        rule.from_lit, rule.from_search, rule.from_all_re, from_addr
+    ):
         return False
-    if body_patterns:
-        # Check both text and HTML content for body patterns
-        body_text_matches = _match_all(body_patterns, body_text)
-        body_html_matches = body_html is not None and _match_all(
-            body_patterns, body_html
-        )
-        if not (body_text_matches or body_html_matches):
-            return False
-    if from_patterns and not _match_all(from_patterns, from_addr):
+    if (rule.to_re or rule.to_lit) and not _field_matches(
+        rule.to_lit, rule.to_search, rule.to_all_re, to_addr
+    ):
         return False
-    if to_patterns and not _match_all(to_patterns, to_addr):
+    if (rule.subject_re or rule.subject_lit) and not _field_matches(
+        rule.subject_lit, rule.subject_search, rule.subject_all_re, subject
+    ):
         return False
+    if rule.body_re or rule.body_lit:
+        # Text and HTML are alternative representations of the body, so each
+        # part is evaluated independently: all of the rule's patterns must
+        # match within the same part for it to count. Concatenating the parts
+        # would let anchors and DOTALL patterns span the text/HTML boundary
+        # and let multi-pattern rules fire across parts.
+        matched = _field_matches(
+            rule.body_lit, rule.body_search, rule.body_all_re, body_text
+        )
+        if not matched and body_html is not None:
+            matched = _field_matches(
+                rule.body_lit, rule.body_search, rule.body_all_re, body_html
+            )
+        if not matched:
+            return False
     return True
 
 
-def _ensure_list(value: Any) -> List[str]:
-    """Convert value to a list of strings."""
-    if value is None:
-        return []
-    if isinstance(value, str):
-        return [value]
-    if isinstance(value, (list, tuple)):
-        return [str(v) for v in value]
-    return [str(value)]
-
-
 def _decode_header_value(raw_value: Optional[str]) -> str:
     """Decode email header value, handling encoding properly."""
     if not raw_value:
         return ""
+    # RFC 2047 encoded words always contain "=?"; plain ASCII headers (the
+    # common case) can skip the decode_header state machine entirely.
+    if "=?" not in raw_value:
+        return raw_value
+    return _decode_encoded_header(raw_value)
+
+
+@lru_cache(maxsize=4096)
+def _decode_encoded_header(raw_value: str) -> str:
+    """Decode an RFC 2047 encoded header value, memoized.
+
+    Newsletters repeat identical encoded From/Subject values across many
+    messages, so the cache turns most decodes into a dict lookup.
+    """
     try:
         decoded_parts = decode_header(raw_value)
         fragments: List[str] = []
@@ -96,22 +179,50 @@ def _decode_header_value(raw_value: Optional[str]) -> str:
         return raw_value
 
 
-def _extract_text_and_html_from_email(msg: Message) -> Tuple[str, Optional[str]]:
+def _extract_text_and_html_from_email(
+    msg: Message, max_body_bytes: Optional[int] = None, render_html: bool = False
+) -> Tuple[str, Optional[str]]:
     """Return both text and HTML content from an email message.
 
+    When max_body_bytes is set, each text part's raw payload is truncated to
+    that many bytes before decoding. Rule patterns virtually always match in
+    the first few KB, so capping the decoded text keeps multi-megabyte bodies
+    (forwarded chains, inline images leaking into text parts) from dominating
+    scan time.
+
+    HTML parts are tag-stripped by default, which is all rule matching
+    needs; render_html=True runs the full inscriptis conversion instead
+    (used for human-readable display only).
+
     Returns:
         Tuple of (text_content, html_content_as_text)
         html_content_as_text is None if no HTML parts found
     """
     try:
+        # メッセージレベルの charset は一度だけ求め、charset 未指定パートの
+        # フォールバックに使う (パート毎の charset 指定はそのまま尊重する)
+        default_charset = msg.get_content_charset() or "utf-8"
+
         if msg.is_multipart():
             plain_text_candidates: List[str] = []
-            html_text_candidates: List[str] = []
-            for part in msg.walk():
+            # (text, part was inside a multipart/alternative)
+            html_text_candidates: List[Tuple[str, bool]] = []
+
+            def _visit(part: Message, in_alternative: bool) -> None:
+                if part.is_multipart():
+                    child_alt = (
+                        in_alternative
+                        or (part.get_content_subtype() or "").lower() == "alternative"
+                    )
+                    payload = part.get_payload()
+                    if isinstance(payload, list):
+                        for child in payload:
+                            _visit(child, child_alt)
+                    return
                 content_type = (part.get_content_type() or "").lower()
                 content_disposition = (part.get("Content-Disposition") or "").lower()
                 if "attachment" in content_disposition:
-                    continue
+                    return
                 part_payload_bytes: Optional[bytes] = None
                 try:
                     maybe_bytes = part.get_payload(decode=True)
@@ -122,8 +233,10 @@ def _extract_text_and_html_from_email(msg: Message) -> Tuple[str, Optional[str]]
                 else:
                     part_payload_bytes = None
                 if not part_payload_bytes:
-                    continue
-                charset = part.get_content_charset() or "utf-8"
+                    return
+                if max_body_bytes and len(part_payload_bytes) > max_body_bytes:
+                    part_payload_bytes = part_payload_bytes[:max_body_bytes]
+                charset = part.get_content_charset() or default_charset
                 try:
                     text_content = part_payload_bytes.decode(charset, errors="replace")
                 except Exception:
@@ -132,21 +245,29 @@ def _extract_text_and_html_from_email(msg: Message) -> Tuple[str, Optional[str]]
                 if content_type == "text/plain":
                     plain_text_candidates.append(text_content)
                 elif content_type == "text/html":
-                    try:
-                        html_text_candidates.append(convert_html_to_text(text_content))
-                    except Exception:
-                        html_text_candidates.append(text_content)
+                    html_text_candidates.append((text_content, in_alternative))
+
+            _visit(msg, False)
+
+            # multipart/alternative の HTML は text/plain と同内容の表現違い
+            # なので、text/plain が取れていればスキャン対象から外す。
+            # テキスト変換は残った HTML に対してのみ行う
+            if plain_text_candidates:
+                kept_html = [t for t, alt in html_text_candidates if not alt]
+            else:
+                kept_html = [t for t, _ in html_text_candidates]
+            html_texts: List[str] = []
+            for html in kept_html:
+                html_texts.append(
+                    _render_html(html) if render_html else _strip_html_tags(html)
+                )
 
             text_result = (
                 "\n\n".join(plain_text_candidates).strip()
                 if plain_text_candidates
                 else ""
             )
-            html_result = (
-                "\n\n".join(html_text_candidates).strip()
-                if html_text_candidates
-                else None
-            )
+            html_result = "\n\n".join(html_texts).strip() if html_texts else None
 
             return text_result, html_result
 
@@ -167,35 +288,54 @@ def _extract_text_and_html_from_email(msg: Message) -> Tuple[str, Optional[str]]
 
             # payload may be already str
             if content_type == "text/html":
-                try:
-                    html_as_text = convert_html_to_text(payload_str)
-                    return "", html_as_text
-                except Exception:
-                    return "", payload_str
+                if render_html:
+                    return "", _render_html(payload_str)
+                return "", _strip_html_tags(payload_str)
 
             return str(payload_str), None
 
-        charset = msg.get_content_charset() or "utf-8"
+        if max_body_bytes and len(payload_bytes) > max_body_bytes:
+            payload_bytes = payload_bytes[:max_body_bytes]
         try:
-            text_content = payload_bytes.decode(charset, errors="replace")
+            text_content = payload_bytes.decode(default_charset, errors="replace")
         except Exception:
             text_content = payload_bytes.decode("utf-8", errors="replace")
         if content_type == "text/html":
-            try:
-                html_as_text = convert_html_to_text(text_content)
-                return "", html_as_text
-            except Exception:
-                return "", text_content
+            if render_html:
+                return "", _render_html(text_content)
+            return "", _strip_html_tags(text_content)
 
         return text_content, None
     except Exception:
         return "", None
 
 
-def message_fields(msg: Message) -> Tuple[str, str, str, str, Optional[str]]:
-    """Extract subject, from, to, body text and body html from a message."""
+def message_fields(
+    msg: Message, max_body_bytes: Optional[int] = None, want_body: bool = True
+) -> Tuple[str, str, str, str, Optional[str]]:
+    """Extract subject, from, to, body text and body html from a message.
+
+    max_body_bytes caps the raw bytes decoded per body part (None/0 for
+    unlimited); see _extract_text_and_html_from_email. Pass want_body=False
+    when no rule references the body to skip the MIME walk entirely.
+    """
     subject = _decode_header_value(msg.get("Subject"))
     from_addr = _decode_header_value(msg.get("From"))
     to_addr = _decode_header_value(msg.get("To"))
-    body_text, body_html = _extract_text_and_html_from_email(msg)
+    if want_body:
+        body_text, body_html = _extract_text_and_html_from_email(msg, max_body_bytes)
+    else:
+        body_text, body_html = "", None
     return subject, from_addr, to_addr, body_text, body_html
+
+
+def rendered_body_text(msg: Message) -> str:
+    """Return the message body rendered for human-readable display.
+
+    Unlike message_fields, HTML parts go through the full inscriptis
+    renderer here. Callers invoke this lazily (interactive full-body
+    view), so the expensive conversion runs only for the handful of
+    messages a user actually inspects.
+    """
+    text, html = _extract_text_and_html_from_email(msg, render_html=True)
+    return text or html or ""